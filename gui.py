@@ -1,47 +1,383 @@
 # gui.py
 import sys
 import os
-import cv2
 import logging
+from collections import namedtuple
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, 
-    QLabel, QHBoxLayout, QInputDialog, QLineEdit,
-    QComboBox
+    QLabel, QHBoxLayout, QLineEdit,
+    QComboBox, QProgressDialog
 )
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter, QPixmap, QPixmapCache
+from PyQt5.QtCore import Qt, QObject, QRect, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal
+
+# OpenCV is imported inside the functions that use it, so the
+# window can appear before it loads. main.py defers its heavy imports too.
 
 # Import core logic from main.py.
-from main import create_pdf, ASSETS_FOLDER, OUTPUT_FOLDER
+from main import batch_extract_reg_numbers, crop_reg_number_roi, create_pdf, list_asset_images
 
 # Configure logging
 LOG_FILE = 'scanning_log.txt'
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
                     format='%(asctime)s - %(message)s')
 
+# Upper bound for cached preview pixmaps, in KB (64 MB).
+PREVIEW_CACHE_LIMIT_KB = 65536
+
+# Idle delay before a quick preview is replaced by a smoothly scaled one.
+PREVIEW_REFINE_DELAY_MS = 120
+
+def fit_image(image, width, height, interpolation):
+    """
+    Resizes a decoded BGR image to fit inside width x height, keeping its aspect ratio.
+    """
+    import cv2
+
+    image_height, image_width = image.shape[:2]
+    scale = min(width / image_width, height / image_height)
+    size = (max(1, int(image_width * scale)), max(1, int(image_height * scale)))
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+def bgr_to_qimage(image):
+    """
+    Wraps a BGR NumPy image in a QImage that shares its buffer.
+    """
+    return QImage(image.data, image.shape[1], image.shape[0], image.strides[0], QImage.Format_BGR888)
+
+
+# A booklet queued for PDF creation. reg_number is None when it still has to be read
+# by OCR, from first_page_roi if that was cached at capture time.
+Booklet = namedtuple('Booklet', ['image_paths', 'reg_number', 'subject_code', 'first_page_roi'])
+
+
+class PrefetchSignals(QObject):
+    loaded = pyqtSignal(str, QImage, object)
+
+
+class Prefetcher(QRunnable):
+    """
+    Decodes a page on a pool thread so it is ready before it is shown.
+    Emits the downscaled preview and a copy of the registration number ROI,
+    or a null QImage if the page cannot be read.
+    """
+    def __init__(self, image_path, width, height):
+        super().__init__()
+        self.image_path = image_path
+        self.width = width
+        self.height = height
+        self.signals = PrefetchSignals()
+
+    def run(self):
+        import cv2
+
+        image = cv2.imread(self.image_path)
+        if image is None:
+            self.signals.loaded.emit(self.image_path, QImage(), None)
+            return
+        preview = fit_image(image, self.width, self.height, cv2.INTER_AREA)
+        roi = crop_reg_number_roi(image)
+        # copy() detaches the QImage and ROI from buffers that do not outlive this call
+        self.signals.loaded.emit(self.image_path, bgr_to_qimage(preview).copy(),
+                                 None if roi is None else roi.copy())
+
+
+class PdfWorker(QThread):
+    """
+    Runs OCR and PDF creation in a background thread so the UI stays responsive.
+    Takes a queue of Booklets. Booklets without a registration number get it read
+    from their first page, all in one OCR pass.
+    Stops between pages when requestInterruption() is called.
+    """
+    progress = pyqtSignal(str)
+    page_progress = pyqtSignal(int)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, booklets, parent=None):
+        super().__init__(parent)
+        self.booklets = [booklet._replace(image_paths=list(booklet.image_paths)) for booklet in booklets]
+
+    def run(self):
+        # An exception escaping QThread.run() aborts the whole application, so report it instead
+        try:
+            self.process_booklets()
+        except Exception as e:
+            logging.exception("GUI: PDF worker failed.")
+            self.failed.emit(f"FAILURE: PDF creation stopped with an error: {e}")
+
+    def process_booklets(self):
+        import cv2
+
+        reg_numbers = [booklet.reg_number for booklet in self.booklets]
+        unnamed = [i for i, reg_number in enumerate(reg_numbers) if reg_number is None]
+        # Booklets whose registration number could not be read, already reported as failed
+        unreadable = set()
+        if unnamed:
+            self.progress.emit("Reading the Registration Number from the first page...")
+            ocr_indices = []
+            rois = []
+            for i in unnamed:
+                roi = self.booklets[i].first_page_roi
+                if roi is None:
+                    roi = crop_reg_number_roi(cv2.imread(self.booklets[i].image_paths[0]))
+                if roi is None:
+                    page_name = os.path.basename(self.booklets[i].image_paths[0])
+                    self.failed.emit(f"FAILURE: Could not read the Registration Number area of {page_name}.")
+                    unreadable.add(i)
+                    continue
+                ocr_indices.append(i)
+                rois.append(roi)
+            if rois:
+                try:
+                    ocr_results = batch_extract_reg_numbers(rois, pre_cropped=True)
+                except Exception as e:
+                    # e.g. Tesseract is not installed; the booklets typed in by hand can still be saved
+                    logging.exception("GUI: OCR failed.")
+                    for i in ocr_indices:
+                        self.failed.emit(f"FAILURE: OCR could not run ({e}). Enter the Registration Number manually.")
+                        unreadable.add(i)
+                else:
+                    for i, reg_number in zip(ocr_indices, ocr_results):
+                        reg_numbers[i] = reg_number
+
+        for i, (booklet, reg_number) in enumerate(zip(self.booklets, reg_numbers)):
+            if self.isInterruptionRequested():
+                self.cancelled.emit()
+                return
+            if i in unreadable:
+                continue
+            if not reg_number:
+                self.failed.emit("FAILURE: OCR could not read the Registration Number. Enter it manually, or set SCANNER_DEBUG=1 to save `processed_reg_num.png` to the output folder and check the `REG_NUM_ROI` in main.py.")
+                continue
+
+            pdf_name = f"{reg_number}_{booklet.subject_code}" if booklet.subject_code else reg_number
+            self.progress.emit(f"Creating PDF with name: {pdf_name}...")
+            pdf_path = create_pdf(booklet.image_paths, pdf_name,
+                                  progress=self.page_progress.emit,
+                                  cancelled=self.isInterruptionRequested)
+            if pdf_path:
+                self.completed.emit(pdf_path)
+            elif self.isInterruptionRequested():
+                self.cancelled.emit()
+                return
+            else:
+                self.failed.emit(f"FAILURE: PDF creation failed for name {pdf_name}.")
+
+
+class PreviewWidget(QWidget):
+    """
+    Paints the current preview pixmap (or a message) directly, centred and
+    aspect-fitted, instead of handing a new pixmap to a QLabel on every update.
+    """
+    def __init__(self, text="", parent=None):
+        super().__init__(parent)
+        # Let the stylesheet border and background be drawn for a plain QWidget
+        self.setAttribute(Qt.WA_StyledBackground, True)
+        self._pm = None
+        self._text = text
+
+    def target_size(self):
+        """Size a pixmap should be scaled to so it is drawn without further scaling."""
+        return self.contentsRect().size()
+
+    def setImage(self, pm):
+        self._pm = pm
+        self._text = ""
+        self.update()
+
+    def setText(self, text):
+        self._pm = None
+        self._text = text
+        self.update()
+
+    def clear(self):
+        self.setText("")
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        area = self.contentsRect()
+        if self._pm is not None and not self._pm.isNull():
+            target = QRect(area.topLeft(), self._pm.size().scaled(area.size(), Qt.KeepAspectRatio))
+            target.moveCenter(area.center())
+            painter.drawPixmap(target, self._pm, self._pm.rect())
+        elif self._text:
+            painter.drawText(area, Qt.AlignCenter | Qt.TextWordWrap, self._text)
+
 
-class ScannerApp(QWidget):
+class ScannerView:
+    """
+    Asset listing and live preview shared by scanner windows.
+    Expects the widget to provide a PreviewWidget as `viewer` and to call `init_viewer()` before use.
+    """
+    def init_viewer(self):
+        self.mock_image_paths = list_asset_images()
+        self.mock_image_index = 0
+        
+        # Swaps in a smoothly scaled preview once captures pause
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(PREVIEW_REFINE_DELAY_MS)
+        self.refine_timer.timeout.connect(self._refine_preview)
+        self._preview_source = None
+        self._preview_key = None
+        self._preview_buffer = None
+        # (path, registration number ROI) of the page on screen, when decoded
+        self._current_page = None
+        # (path, ROI) of the last first page captured, so the next booklet starting on a page
+        # shown from QPixmapCache does not decode it again
+        self._first_page_roi = None
+        
+        # Next pages decoded ahead of time on a private pool. Qt converts large images on the
+        # global pool while QPixmap.fromImage holds the GIL, so a Python runnable there deadlocks it.
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._prefetched = {}
+        self._prefetching = set()
+
+    def refresh_assets(self):
+        """
+        Rescans the assets folder, rebuilding its index, and redraws the preview.
+        """
+        self.mock_image_paths = list_asset_images(refresh=True)
+        self._first_page_roi = None
+        self.mock_image_index = min(self.mock_image_index, len(self.mock_image_paths))
+        self.update_live_viewer()
+
+    def preview_cache_key(self, image_path):
+        size = self.viewer.target_size()
+        return f"{image_path}:{size.width()}x{size.height()}"
+
+    def update_live_viewer(self):
+        import cv2
+
+        # A new page supersedes any refinement still pending for the previous one
+        self.refine_timer.stop()
+        self._preview_source = None
+        self._current_page = None
+
+        if self.mock_image_index < len(self.mock_image_paths):
+            image_path = self.mock_image_paths[self.mock_image_index]
+            # Smooth scaling is expensive, so keep the scaled result for pages we revisit
+            cache_key = self.preview_cache_key(image_path)
+            scaled_pixmap = QPixmapCache.find(cache_key)
+            prefetched = self._prefetched.pop(image_path, None)
+            if prefetched is not None:
+                preview, roi = prefetched
+                self._current_page = (image_path, roi)
+                if scaled_pixmap is None:
+                    scaled_pixmap = QPixmap.fromImage(preview)
+                    QPixmapCache.insert(cache_key, scaled_pixmap)
+            if scaled_pixmap is None:
+                self._preview_source = cv2.imread(image_path)
+                if self._preview_source is None:
+                    self.viewer.setText(f"Could not read {os.path.basename(image_path)}.")
+                    return
+                # Show a fast nearest-neighbour preview now and refine it when idle
+                scaled_pixmap = self._scale_preview(cv2.INTER_NEAREST)
+                roi = crop_reg_number_roi(self._preview_source)
+                self._current_page = (image_path, None if roi is None else roi.copy())
+                self._preview_key = cache_key
+                self.refine_timer.start()
+            self.viewer.setImage(scaled_pixmap)
+            self.prefetch_next_page()
+        else:
+            self.viewer.setText("Live Capture Mode: Ready to capture new pages.")
+
+    def prefetch_next_page(self):
+        next_index = self.mock_image_index + 1
+        if next_index >= len(self.mock_image_paths):
+            return
+        next_path = self.mock_image_paths[next_index]
+        cache_key = self.preview_cache_key(next_path)
+        if next_path in self._prefetched or next_path in self._prefetching or QPixmapCache.find(cache_key) is not None:
+            return
+
+        self._prefetching.add(next_path)
+        size = self.viewer.target_size()
+        prefetcher = Prefetcher(next_path, size.width(), size.height())
+        prefetcher.signals.loaded.connect(self._store_prefetched)
+        self.pool.start(prefetcher)
+
+    def _store_prefetched(self, image_path, qimage, roi):
+        self._prefetching.discard(image_path)
+        if qimage.isNull():
+            # update_live_viewer decodes the page again and reports it if it is still unreadable
+            return
+        self._prefetched[image_path] = (qimage, roi)
+
+    def take_current_page(self, with_roi=True):
+        """
+        Returns (path, registration number ROI) for the page on screen, reusing the ROI
+        the preview pipeline already cropped. The ROI is None when with_roi is False.
+        Returns None if the page cannot be read.
+        """
+        import cv2
+
+        image_path = self.mock_image_paths[self.mock_image_index]
+        if not with_roi:
+            return (image_path, None)
+        if self._current_page is not None and self._current_page[0] == image_path:
+            page = self._current_page
+        elif self._first_page_roi is not None and self._first_page_roi[0] == image_path:
+            page = self._first_page_roi
+        else:
+            # The preview came from QPixmapCache, so the page has to be decoded once here
+            image = cv2.imread(image_path)
+            if image is None:
+                return None
+            roi = crop_reg_number_roi(image)
+            page = (image_path, None if roi is None else roi.copy())
+        self._first_page_roi = page
+        return page
+
+    def _scale_preview(self, interpolation):
+        """
+        Fits the decoded page into the viewer with OpenCV and wraps the result in a QPixmap.
+        """
+        # QImage shares the resized buffer, so it has to stay referenced
+        size = self.viewer.target_size()
+        self._preview_buffer = fit_image(self._preview_source, size.width(), size.height(), interpolation)
+        return QPixmap.fromImage(bgr_to_qimage(self._preview_buffer))
+
+    def _refine_preview(self):
+        import cv2
+
+        if self._preview_source is None:
+            return
+        # INTER_AREA gives the best quality when shrinking large scans
+        scaled_pixmap = self._scale_preview(cv2.INTER_AREA)
+        QPixmapCache.insert(self._preview_key, scaled_pixmap)
+        self._preview_source = None
+        self.viewer.setImage(scaled_pixmap)
+
+
+class ScannerApp(ScannerView, QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Booklet Scanner Automation Tool")
         self.setGeometry(100, 100, 800, 600)
+        QPixmapCache.setCacheLimit(PREVIEW_CACHE_LIMIT_KB)
         
         self.current_booklet_images = []
-        self.mock_image_paths = sorted([os.path.join(ASSETS_FOLDER, f) for f in os.listdir(ASSETS_FOLDER) if f.endswith(('jpg', 'png'))])
-        self.mock_image_index = 0
+        self.progress_dialog = None
+        self.init_viewer()
         
         self.initUI()
-        self.update_live_viewer()
+        # Load the first preview (and OpenCV with it) once the window is up
+        QTimer.singleShot(0, self.update_live_viewer)
 
     def initUI(self):
         main_layout = QVBoxLayout()
         
         # 1. Live image viewer
-        self.image_label = QLabel("Live image viewer through scanners")
-        self.image_label.setStyleSheet("border: 2px solid black; background-color: #f0f0f0;")
-        self.image_label.setAlignment(Qt.AlignCenter)
-        self.image_label.setFixedSize(780, 400)
-        main_layout.addWidget(self.image_label)
+        self.viewer = PreviewWidget("Live image viewer through scanners")
+        self.viewer.setStyleSheet("border: 2px solid black; background-color: #f0f0f0;")
+        self.viewer.setContentsMargins(2, 2, 2, 2)
+        self.viewer.setFixedSize(780, 400)
+        main_layout.addWidget(self.viewer)
         
         # 2. Status label
         self.status_label = QLabel("Ready to start a new booklet. Capture the first page.")
@@ -60,6 +396,12 @@ class ScannerApp(QWidget):
         self.subject_combo.setFixedSize(80, 30)
         controls_layout.addWidget(self.subject_combo)
         
+        # Registration number, typed in while the pages are being captured
+        self.reg_input = QLineEdit()
+        self.reg_input.setPlaceholderText("Registration No.")
+        self.reg_input.setFixedSize(160, 30)
+        controls_layout.addWidget(self.reg_input)
+        
         # Add stretch to push buttons to the right
         controls_layout.addStretch(1)
         
@@ -79,27 +421,23 @@ class ScannerApp(QWidget):
         
         self.setLayout(main_layout)
 
-    def update_live_viewer(self):
-        if self.mock_image_index < len(self.mock_image_paths):
-            image_path = self.mock_image_paths[self.mock_image_index]
-            pixmap = QPixmap(image_path)
-            scaled_pixmap = pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.image_label.setPixmap(scaled_pixmap)
-        else:
-            self.image_label.clear()
-            self.image_label.setText("Live Capture Mode: Ready to capture new pages.")
-            
     def capture_page(self):
         if self.mock_image_index < len(self.mock_image_paths):
-            page_path = self.mock_image_paths[self.mock_image_index]
-            self.current_booklet_images.append(page_path)
+            # Only the first page's ROI is used for OCR, so later pages never need decoding here
+            page = self.take_current_page(with_roi=not self.current_booklet_images)
+            if page is None:
+                page_name = os.path.basename(self.mock_image_paths[self.mock_image_index])
+                self.status_label.setText(f"FAILURE: Could not read {page_name}. The page was not captured.")
+                logging.error(f"GUI: Could not read {page_name} on capture.")
+                return
+            self.current_booklet_images.append(page)
             self.mock_image_index += 1
             self.status_label.setText(f"Page {len(self.current_booklet_images)} captured. Ready for the next page.")
             self.update_live_viewer()
         else:
-            self.current_booklet_images.append(None)
+            self.current_booklet_images.append((None, None))
             self.status_label.setText(f"Page {len(self.current_booklet_images)} captured. Ready for the next page.")
-            self.image_label.setText("Live Capture Mode: New page captured.")
+            self.viewer.setText("Live Capture Mode: New page captured.")
             
     def finish_to_pdf(self):
         if not self.current_booklet_images:
@@ -107,47 +445,91 @@ class ScannerApp(QWidget):
             logging.warning("GUI: User attempted to finish with no pages captured.")
             return
 
-        self.status_label.setText("Processing booklet. Awaiting PDF name...")
-        QApplication.processEvents()
+        reg_number = self.reg_input.text().strip()
+        if reg_number and not reg_number.isdigit():
+            self.status_label.setText("The Registration Number may only contain digits.")
+            logging.warning(f"GUI: Rejected registration number '{reg_number}'.")
+            return
+
+        subject_code = self.subject_combo.currentText()
         
-        reg_number, ok_pressed = QInputDialog.getText(
-            self, 
-            "Enter PDF Name", 
-            "Please enter the Registration Number:", 
-            QLineEdit.Normal
+        actual_pages = [page for page in self.current_booklet_images if page[0] is not None]
+
+        if not actual_pages:
+            self.status_label.setText("FAILURE: No valid images were captured.")
+            logging.error("GUI: No valid images found to create PDF.")
+            self.current_booklet_images.clear()
+            self.mock_image_index = 0
+            self.update_live_viewer()
+            return
+
+        # Without a typed number, the worker OCRs the ROI cached when the first page was captured
+        booklet = Booklet(
+            image_paths=[path for path, _ in actual_pages],
+            reg_number=reg_number or None,
+            subject_code=subject_code,
+            first_page_roi=actual_pages[0][1],
         )
-        
-        if ok_pressed and reg_number:
-            subject_code = self.subject_combo.currentText()
-            final_pdf_name = f"{reg_number}_{subject_code}"
-            
-            self.status_label.setText(f"Creating PDF with name: {final_pdf_name}...")
-            QApplication.processEvents()
-            
-            actual_images = [img for img in self.current_booklet_images if img is not None]
-
-            if not actual_images:
-                self.status_label.setText("FAILURE: No valid images were captured.")
-                logging.error("GUI: No valid images found to create PDF.")
-                self.current_booklet_images.clear()
-                self.mock_image_index = 0
-                self.update_live_viewer()
-                return
 
-            pdf_path = create_pdf(actual_images, final_pdf_name)
-            
-            if pdf_path:
-                self.status_label.setText(f"SUCCESS: PDF saved as {os.path.basename(pdf_path)}. Ready for a new booklet.")
-                logging.info(f"GUI SUCCESS: Booklet processed. PDF saved to {pdf_path}")
-                self.current_booklet_images.clear()
-                self.mock_image_index = 0
-                self.update_live_viewer()
-            else:
-                self.status_label.setText(f"FAILURE: PDF creation failed.")
-                logging.error(f"GUI FAILURE: PDF creation failed for name {final_pdf_name}.")
-        else:
-            self.status_label.setText("PDF creation cancelled.")
-            logging.info("GUI: PDF creation cancelled by user.")
+        # Hand the slow PDF build to a worker thread and return immediately.
+        self.capture_button.setEnabled(False)
+        self.finish_button.setEnabled(False)
+        self.pdf_worker = PdfWorker([booklet], self)
+        self.pdf_worker.finished.connect(self.pdf_worker.deleteLater)
+        self.progress_dialog = QProgressDialog("Building PDF…", "Cancel", 0, len(booklet.image_paths), self)
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        # The dialog is hidden by the worker's result slots, not when the last page is done
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.canceled.connect(self.pdf_worker.requestInterruption)
+        self.pdf_worker.progress.connect(self.status_label.setText)
+        self.pdf_worker.page_progress.connect(self.progress_dialog.setValue)
+        self.pdf_worker.completed.connect(self.on_pdf_completed)
+        self.pdf_worker.failed.connect(self.on_pdf_failed)
+        self.pdf_worker.cancelled.connect(self.on_pdf_cancelled)
+        self.pdf_worker.start()
+
+    def closeEvent(self, event):
+        # A worker destroyed with the window while running aborts the app and leaves its
+        # .part file behind, so stop any build at its next page and wait for it
+        for worker in self.findChildren(PdfWorker):
+            worker.requestInterruption()
+            worker.wait()
+        super().closeEvent(event)
+
+    def close_progress_dialog(self):
+        # A worker may report several results, but the dialog is only closed once
+        if self.progress_dialog is None:
+            return
+        # hide() rather than close(), which would emit canceled()
+        self.progress_dialog.hide()
+        self.progress_dialog.deleteLater()
+        self.progress_dialog = None
+
+    def on_pdf_completed(self, pdf_path):
+        self.close_progress_dialog()
+        self.status_label.setText(f"SUCCESS: PDF saved as {os.path.basename(pdf_path)}. Ready for a new booklet.")
+        logging.info(f"GUI SUCCESS: Booklet processed. PDF saved to {pdf_path}")
+        self.current_booklet_images.clear()
+        self.reg_input.clear()
+        self.mock_image_index = 0
+        self.capture_button.setEnabled(True)
+        self.finish_button.setEnabled(True)
+        self.update_live_viewer()
+
+    def on_pdf_failed(self, message):
+        self.close_progress_dialog()
+        self.status_label.setText(message)
+        logging.error(f"GUI {message}")
+        self.capture_button.setEnabled(True)
+        self.finish_button.setEnabled(True)
+
+    def on_pdf_cancelled(self):
+        self.close_progress_dialog()
+        self.status_label.setText("PDF creation cancelled.")
+        logging.info("GUI: PDF creation cancelled by user.")
+        self.capture_button.setEnabled(True)
+        self.finish_button.setEnabled(True)
             
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -1,10 +1,16 @@
-import pytesseract
-import cv2
 import os
-from PIL import Image
-import numpy as np
 import logging
 import datetime
+import threading
+from pathlib import Path
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# OpenCV, NumPy, PIL, img2pdf and pytesseract are slow to load, so they are
+# imported inside the functions that need them. Importing this module (as the
+# GUI does) stays cheap until the first OCR or PDF call.
 
 # ====================================================================
 # CONFIGURATION
@@ -12,21 +18,39 @@ import datetime
 
 # Specify the path to the Tesseract executable. 
 # You may need to change this if Tesseract is not in your system's PATH.
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 # Define the folder paths
 ASSETS_FOLDER = 'assets/'
 OUTPUT_FOLDER = 'output/'
 LOG_FILE = 'scanning_log.txt'
 
+# Newline-separated, naturally sorted listing of an assets folder, stored inside it.
+ASSET_INDEX_NAME = '.index'
+
+# Sorted asset listings keyed by folder, reused while the folder's mtime is unchanged.
+_ASSET_CACHE = {}
+
+# Rows of background inserted between the ROIs when several booklets are OCRed in one pass.
+OCR_BATCH_SEPARATOR = 20
+
+# Pages decoded ahead in parallel when building a PDF through PIL.
+# Each one holds a full decoded page in memory, so keep this small.
+PDF_DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Set the SCANNER_DEBUG environment variable to save the pre-processed ROI as
+# 'processed_reg_num.png' on every OCR run and to log debug messages.
+DEBUG = bool(os.environ.get('SCANNER_DEBUG'))
+
 # Configure logging
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
+logging.basicConfig(filename=LOG_FILE, level=logging.DEBUG if DEBUG else logging.INFO,
                     format='%(asctime)s - %(message)s')
 
 # DEFINE THE REGION OF INTEREST (ROI) FOR THE REGISTRATION NUMBER
 # You MUST update these coordinates to match the location of the handwritten number
 # on your first page image (Screenshot (8).png).
 # Format: (x, y, width, height)
+REG_NUM_ROI = (60, 140, 280, 40)
 #REG_NUM_ROI = (450, 250, 180, 40) # Example coordinates, please use your own!
 #REG_NUM_ROI = (90, 80, 330, 30)
 
@@ -34,12 +58,22 @@ logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
 # CORE FUNCTIONS
 # ====================================================================
 
+def load_pytesseract():
+    """
+    Imports pytesseract on first use and points it at TESSERACT_CMD.
+    """
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
 def mock_scanner(image_path):
     """
     This function simulates a scanner by reading an image from a file.
     In a real application, this would be replaced by code that
     interfaces with a real scanner using libraries like python-twain.
     """
+    import cv2
+
     if not os.path.exists(image_path):
         print(f"Error: Mock scanner failed to find image at {image_path}")
         return None
@@ -52,6 +86,8 @@ def find_document_corners(image):
     Detects the four corners of the document in the image.
     This is the first step for perspective correction.
     """
+    import cv2
+
     # Convert the image to grayscale and blur it
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     gray = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -78,6 +114,9 @@ def deskew_and_crop(image):
     """
     Corrects the perspective of the document in the image.
     """
+    import cv2
+    import numpy as np
+
     corners = find_document_corners(image)
     
     if corners is None:
@@ -117,15 +156,26 @@ def deskew_and_crop(image):
     
     return warped
 
-def preprocess_image_for_ocr(image):
+def save_debug_roi(binary):
     """
-    Pre-processes the image to make it more readable for OCR.
-    This includes cropping the ROI, converting to grayscale, and thresholding.
+    Saves the pre-processed ROI to the output folder so REG_NUM_ROI can be checked
+    and calibrated. Returns the path of the saved image.
+    """
+    import cv2
+
+    processed_image_path = Path(OUTPUT_FOLDER) / 'processed_reg_num.png'
+    cv2.imwrite(str(processed_image_path), binary)
+    logging.debug(f"Pre-processed image saved to: {processed_image_path}")
+    return processed_image_path
+
+def crop_reg_number_roi(image):
+    """
+    Crops the registration number region (REG_NUM_ROI) out of a full page image.
+    Returns a view into the image, or None if the ROI is invalid.
     """
     if image is None:
         return None
 
-    # Crop the image to the defined ROI
     x, y, w, h = REG_NUM_ROI
     if w <= 0 or h <= 0:
         print("Error: REG_NUM_ROI width or height is zero or negative. Please set valid coordinates.")
@@ -137,30 +187,64 @@ def preprocess_image_for_ocr(image):
         print("Error: Cropped image is empty. REG_NUM_ROI coordinates might be wrong.")
         return None
 
+    return cropped_image
+
+# Grayscale/binary scratch buffers for OCR pre-processing, per thread and ROI shape.
+_ocr_buffers = threading.local()
+
+def get_ocr_buffers(shape):
+    """
+    Returns the (gray, binary) uint8 buffers of the given shape for the calling thread,
+    allocating them on first use.
+    """
+    import numpy as np
+
+    buffers = getattr(_ocr_buffers, 'by_shape', None)
+    if buffers is None:
+        buffers = _ocr_buffers.by_shape = {}
+    if shape not in buffers:
+        gray = np.empty(shape, np.uint8)
+        buffers[shape] = (gray, np.empty_like(gray))
+    return buffers[shape]
+
+def preprocess_image_for_ocr(image, pre_cropped=False):
+    """
+    Pre-processes the image to make it more readable for OCR.
+    This includes cropping the ROI, converting to grayscale, and thresholding.
+    Pass pre_cropped=True if the image is already the ROI from crop_reg_number_roi().
+    The result lives in a reused buffer, so copy it if it must outlive the next call.
+    """
+    import cv2
+
+    if image is None:
+        return None
+
+    # Crop the image to the defined ROI
+    cropped_image = image if pre_cropped else crop_reg_number_roi(image)
+    if cropped_image is None:
+        return None
+
+    # Write into preallocated buffers instead of allocating new images on every call
+    gray, binary = get_ocr_buffers(cropped_image.shape[:2])
+
     # Convert to grayscale
-    gray = cv2.cvtColor(cropped_image, cv2.COLOR_BGR2GRAY)
+    cv2.cvtColor(cropped_image, cv2.COLOR_BGR2GRAY, dst=gray)
 
-    # Apply a binary threshold to make the numbers stand out
-    _, binary = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Apply a binary threshold to make the numbers stand out.
+    # Otsu picks the threshold itself, so the value passed in is ignored.
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU, dst=binary)
 
     # --- DEBUGGING: Save the pre-processed image ---
-    processed_image_path = os.path.join(OUTPUT_FOLDER, 'processed_reg_num.png')
-    cv2.imwrite(processed_image_path, binary)
-    print(f"Pre-processed image saved to: {processed_image_path}")
-    # --- END DEBUGGING ---
+    if DEBUG:
+        save_debug_roi(binary)
 
     return binary
 
-def extract_reg_number(image):
+def clean_reg_number(text):
     """
-    Uses Tesseract OCR to extract the registration number from the image.
+    Strips the OCR output and checks that it looks like a registration number.
+    Returns None if it does not.
     """
-    processed_image = preprocess_image_for_ocr(image)
-    if processed_image is None:
-        return None
-
-    text = pytesseract.image_to_string(processed_image, config='--psm 6 -c tessedit_char_whitelist=0123456789')
-    
     reg_number = text.strip()
     
     if not reg_number.isdigit() or len(reg_number) < 5:
@@ -169,31 +253,245 @@ def extract_reg_number(image):
     
     return reg_number
 
-def create_pdf(image_paths, reg_number):
+def extract_reg_number(image, pre_cropped=False):
+    """
+    Uses Tesseract OCR to extract the registration number from the image.
+    Pass pre_cropped=True if the image is already the registration number ROI.
+    """
+    pytesseract = load_pytesseract()
+
+    processed_image = preprocess_image_for_ocr(image, pre_cropped)
+    if processed_image is None:
+        return None
+
+    # The ROI holds a single line of digits, so skip Tesseract's page layout analysis (PSM 7)
+    text = pytesseract.image_to_string(processed_image, config='--oem 1 --psm 7 -c tessedit_char_whitelist=0123456789')
+    
+    return clean_reg_number(text)
+
+def batch_extract_reg_numbers(images, pre_cropped=False):
+    """
+    Extracts the registration numbers from several first-page images with a single
+    Tesseract run, by stacking their ROIs into one image.
+    Returns one registration number (or None) per input image.
+    """
+    import numpy as np
+    pytesseract = load_pytesseract()
+
+    if len(images) == 1:
+        return [extract_reg_number(images[0], pre_cropped)]
+
+    reg_numbers = [None] * len(images)
+    crops = [image if pre_cropped else crop_reg_number_roi(image) for image in images]
+    crops = [(i, crop) for i, crop in enumerate(crops) if crop is not None and crop.size]
+    if not crops:
+        return reg_numbers
+
+    # Pre-processing reuses one buffer, so each ROI is copied straight into a single
+    # stacked canvas. The ROIs are inverted (white digits on black), so the canvas
+    # starts black and the rows left between them act as separators.
+    width = max(crop.shape[1] for _, crop in crops)
+    canvas = np.zeros((sum(crop.shape[0] + OCR_BATCH_SEPARATOR for _, crop in crops), width), np.uint8)
+    bands = []
+    top = 0
+    for i, crop in crops:
+        binary = preprocess_image_for_ocr(crop, pre_cropped=True)
+        roi_height, roi_width = binary.shape
+        canvas[top:top + roi_height, :roi_width] = binary
+        bands.append((i, top, top + roi_height + OCR_BATCH_SEPARATOR))
+        top += roi_height + OCR_BATCH_SEPARATOR
+
+    data = pytesseract.image_to_data(canvas,
+                                     config='--oem 1 --psm 6 -c tessedit_char_whitelist=0123456789',
+                                     output_type=pytesseract.Output.DICT)
+
+    # Assign each recognised word to the ROI its vertical centre falls in
+    words = {i: [] for i, _, _ in bands}
+    for text, word_top, height in zip(data['text'], data['top'], data['height']):
+        text = text.strip()
+        if not text:
+            continue
+        centre = word_top + height // 2
+        for i, start, end in bands:
+            if start <= centre < end:
+                words[i].append(text)
+                break
+
+    for i, parts in words.items():
+        reg_numbers[i] = clean_reg_number(''.join(parts))
+
+    return reg_numbers
+
+def read_asset_index(index_path, folder_mtime):
+    """
+    Returns the file names stored in an asset index, or None if it is missing
+    or older than the folder it describes.
+    """
+    try:
+        if os.stat(index_path).st_mtime < folder_mtime:
+            return None
+        with open(index_path, encoding='utf-8') as f:
+            return f.read().splitlines()
+    except OSError:
+        return None
+
+def write_asset_index(index_path, names):
+    """
+    Atomically replaces the asset index with the given file names.
+    """
+    part_path = index_path + '.part'
+    try:
+        with open(part_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(names))
+        os.replace(part_path, index_path)
+        # Renaming into the folder bumps its mtime, so touch the index to stay newer than it
+        os.utime(index_path)
+    except OSError as e:
+        logging.warning(f"Could not write asset index {index_path}: {e}")
+
+def list_asset_images(folder=ASSETS_FOLDER, refresh=False):
+    """
+    Returns the paths of the .jpg/.png images in the given folder, in natural order
+    (page2 before page10). The order is kept in the folder's .index file and in memory,
+    and only rebuilt when the folder is modified or refresh is True.
+    """
+    folder_mtime = os.stat(folder).st_mtime
+    cached = _ASSET_CACHE.get(folder)
+    if not refresh and cached is not None and cached[0] == folder_mtime:
+        return list(cached[1])
+
+    index_path = os.path.join(folder, ASSET_INDEX_NAME)
+    names = None if refresh else read_asset_index(index_path, folder_mtime)
+    if names is None:
+        from natsort import natsorted
+
+        with os.scandir(folder) as it:
+            names = natsorted(e.name for e in it if e.is_file() and e.name.lower().endswith(('.jpg', '.png')))
+        write_asset_index(index_path, names)
+        folder_mtime = os.stat(folder).st_mtime
+
+    paths = [os.path.join(folder, name) for name in names]
+    _ASSET_CACHE[folder] = (folder_mtime, paths)
+    return list(paths)
+
+def open_rgb(path):
+    """
+    Opens an image file and converts it to RGB, decoding it fully.
+    """
+    from PIL import Image
+
+    return Image.open(path).convert('RGB')
+
+def iter_rgb_pages(image_paths):
+    """
+    Yields each image converted to RGB, closing it once the caller asks for the next one.
+    The following pages are decoded in parallel, at most PDF_DECODE_WORKERS ahead.
+    Close the generator if you stop early, so the pages decoded ahead are released.
+    """
+    paths = iter(image_paths)
+    with ThreadPoolExecutor(max_workers=PDF_DECODE_WORKERS) as executor:
+        pending = deque(executor.submit(open_rgb, p) for p in islice(paths, PDF_DECODE_WORKERS))
+        try:
+            while pending:
+                img = pending.popleft().result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append(executor.submit(open_rgb, next_path))
+                try:
+                    yield img
+                finally:
+                    img.close()
+        finally:
+            # Only non-empty if the caller stopped early: skip decodes not yet started
+            # and close the pages that were already decoded ahead
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+
+class PdfCancelled(Exception):
+    """
+    Raised while building a PDF once its cancelled() callback returns True.
+    """
+
+class PageSource:
+    """
+    File-like page handed to img2pdf, which reads and converts the pages one at a time.
+    Calls on_read() before the file is read, so each read marks the previous page as done.
+    """
+    def __init__(self, path, on_read):
+        self.path = path
+        self.on_read = on_read
+
+    def read(self):
+        self.on_read()
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+def create_pdf(image_paths, reg_number, progress=None, cancelled=None):
     """
     Combines a list of image paths into a single PDF file.
+    progress(pages_done) is called as each page is converted, and the PDF is abandoned
+    (returning None) as soon as cancelled() returns True.
     """
+    import img2pdf
+
     if not image_paths:
         return None
 
-    images = [Image.open(p).convert('RGB') for p in image_paths]
-    first_image = images[0]
-    
-    pdf_filename = f"{reg_number}.pdf"
-    pdf_path = os.path.join(OUTPUT_FOLDER, pdf_filename)
+    pdf_path = Path(OUTPUT_FOLDER) / f"{reg_number}.pdf"
+    # Write to a temporary file and rename it into place once complete, so a crash
+    # or full disk never leaves a truncated PDF under the registration number
+    part_path = pdf_path.with_name(pdf_path.name + '.part')
+
+    def page_done(pages_done):
+        if cancelled is not None and cancelled():
+            raise PdfCancelled()
+        if progress is not None:
+            progress(pages_done)
     
     try:
-        first_image.save(pdf_path, save_all=True, append_images=images[1:])
+        try:
+            # img2pdf embeds the JPEG/PNG data as-is, without decoding or recompressing it.
+            # It reads each page only when it gets to it, which drives the progress.
+            pdf_bytes = img2pdf.convert([PageSource(p, lambda i=i: page_done(i)) for i, p in enumerate(image_paths)])
+        except img2pdf.AlphaChannelError:
+            # PDF pages cannot carry transparency, so images with an alpha channel
+            # (e.g. screenshots) still have to be flattened to RGB through PIL
+            pdf_bytes = None
+
+        if pdf_bytes is not None:
+            page_done(len(image_paths))
+            with open(part_path, 'wb') as f:
+                f.write(pdf_bytes)
+        else:
+            # save_all collects every appended page in memory before writing, so
+            # append the pages one at a time to hold only a single decoded page
+            page_done(0)
+            with closing(iter_rgb_pages(image_paths)) as pages:
+                for i, img in enumerate(pages):
+                    img.save(part_path, 'PDF', append=i > 0)
+                    page_done(i + 1)
+
+        os.replace(part_path, pdf_path)
         print(f"Successfully created PDF: {pdf_path}")
-        return pdf_path
+        return str(pdf_path)
+    except PdfCancelled:
+        print("PDF creation cancelled.")
+        return None
     except Exception as e:
         print(f"Error creating PDF: {e}")
         return None
+    finally:
+        # Only still present if writing failed or was cancelled
+        if part_path.exists():
+            part_path.unlink()
 
 def main():
     """
     Main function to run the booklet scanning workflow.
     """
+    import cv2
+
     print("Welcome to the Booklet Scanner Automation Tool.")
     print("--------------------------------------------------")
     
@@ -201,7 +499,7 @@ def main():
     
     print("\nSimulating page capture...")
     
-    sample_images = sorted([os.path.join(ASSETS_FOLDER, f) for f in os.listdir(ASSETS_FOLDER) if f.endswith(('jpg', 'png'))])
+    sample_images = list_asset_images()
     
     if not sample_images:
         print("No sample images found in assets folder. Please add some to proceed.")
@@ -212,7 +510,7 @@ def main():
         if captured_image is not None:
             # We add a new step here to deskew the captured image
             deskewed_image = deskew_and_crop(captured_image)
-            temp_path = os.path.join(OUTPUT_FOLDER, f"deskewed_page_{i}.png")
+            temp_path = str(Path(OUTPUT_FOLDER) / f"deskewed_page_{i}.png")
             cv2.imwrite(temp_path, deskewed_image)
             current_booklet_images.append(temp_path)
             print(f"Page {i+1} captured and straightened successfully.")